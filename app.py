@@ -1,8 +1,11 @@
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, jsonify, abort
 from flask_socketio import SocketIO, emit, disconnect
 from queue_manager import QueueManager
 import config
+import profiler
 from motor_controller import MotorController
+from transport_policy import TransportPolicy, TransportTelemetryMiddleware
+import hmac
 import threading
 import time
 
@@ -30,8 +33,23 @@ socketio = SocketIO(
     ping_timeout=60,
     ping_interval=25,
     engineio_logger_level='INFO',
-    # Cloudflare compatibility: use polling as primary since WebSocket may not work
-    transports=['polling', 'websocket'],
+    # Transports the server accepts; per-client order is chosen by transport_policy
+    transports=config.SOCKETIO_TRANSPORTS,
+)
+
+transport_policy = TransportPolicy(
+    policy=config.TRANSPORT_POLICY,
+    known_bad_networks=config.TRANSPORT_KNOWN_BAD_NETWORKS,
+    bad_network_ttl=config.TRANSPORT_BAD_NETWORK_TTL,
+    history_size=config.TRANSPORT_HISTORY_SIZE,
+    trusted_proxies=config.TRANSPORT_TRUSTED_PROXIES,
+    transport_lookup=lambda eio_sid: socketio.server.eio.transport(eio_sid),
+)
+# Wrap outside the Socket.IO middleware so Engine.IO polling/upgrade requests are counted
+app.wsgi_app = TransportTelemetryMiddleware(
+    app.wsgi_app,
+    transport_policy,
+    max_body_size=socketio.server.eio.max_http_buffer_size,
 )
 
 motor_controller = MotorController()
@@ -46,12 +64,70 @@ current_motor_state = {
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', transports=transport_policy.transports_for(request.environ))
+
+def _require_debug_token():
+    """Reject /debug/* requests unless config.DEBUG_TOKEN is set and supplied"""
+    expected = getattr(config, 'DEBUG_TOKEN', None)
+    if not expected:
+        abort(404)
+    # Header only: query strings end up in the access log
+    supplied = request.headers.get('X-Debug-Token', '')
+    if not hmac.compare_digest(str(supplied), str(expected)):
+        abort(403)
+
+@app.route('/debug/timings', methods=['GET', 'POST'])
+def debug_timings():
+    """
+    Handler/method timings. GET is read-only; POST with enable=0|1 toggles
+    the hooks and reset=1 clears them (after returning the current values).
+    """
+    _require_debug_token()
+    timings = profiler.get_timings()
+    if request.method == 'POST':
+        enable = request.values.get('enable')
+        if enable is not None:
+            profiler.set_timing_enabled(enable not in ('0', 'false', 'off'))
+        if request.values.get('reset') in ('1', 'true'):
+            profiler.reset_timings()
+    return jsonify({'enabled': profiler.is_timing_enabled(), 'timings': timings})
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample all thread stacks for ?seconds=N and return folded (flame graph) stacks"""
+    _require_debug_token()
+    try:
+        seconds = float(request.args.get('seconds', 5))
+    except ValueError:
+        abort(400)
+    seconds = max(0.1, min(config.PROFILE_MAX_SECONDS, seconds))
+    folded = profiler.sample_stacks(seconds)
+    if folded is None:
+        return 'Profiler already running\n', 409, {'Content-Type': 'text/plain'}
+    return folded, 200, {'Content-Type': 'text/plain'}
+
+@app.route('/debug/transports')
+def debug_transports():
+    """Per-connection transport, upgrade time and polling overhead"""
+    _require_debug_token()
+    return jsonify(transport_policy.snapshot())
+
+def _engine_transport(sid):
+    """Return (engine.io sid, current transport) for a Socket.IO sid"""
+    try:
+        eio_sid = socketio.server.manager.eio_sid_from_sid(sid, '/')
+        return eio_sid, socketio.server.eio.transport(eio_sid)
+    except Exception:
+        return None, 'unknown'
 
 @socketio.on('connect')
+@profiler.timed('socketio.connect')
 def handle_connect(auth=None):
     client_id = request.sid
     
+    eio_sid, transport = _engine_transport(client_id)
+    transport_policy.open_connection(client_id, eio_sid, transport, request.environ)
+    
     position = queue_manager.add_user(client_id)
     
     print(f"User {client_id} connected at position {position}", flush=True)
@@ -85,8 +161,10 @@ def handle_connect(auth=None):
     })
 
 @socketio.on('disconnect')
+@profiler.timed('socketio.disconnect')
 def handle_disconnect():
     client_id = request.sid
+    transport_policy.close_connection(client_id)
     was_controlling = queue_manager.is_controlling(client_id)
     queue_manager.remove_user(client_id)
     
@@ -112,6 +190,7 @@ def handle_disconnect():
     })
 
 @socketio.on('motor_control')
+@profiler.timed('socketio.motor_control')
 def handle_motor_control(data):
     import sys
     # Write to a debug file as well to ensure it's captured
@@ -167,6 +246,7 @@ def handle_motor_control(data):
         })
 
 @socketio.on('stop_all')
+@profiler.timed('socketio.stop_all')
 def handle_stop_all():
     client_id = request.sid
     
@@ -183,11 +263,23 @@ def handle_stop_all():
     socketio.emit('motor_state', { 'state': current_motor_state })
     socketio.emit('all_stopped', {})
 
+@socketio.on('transport_report')
+@profiler.timed('socketio.transport_report')
+def handle_transport_report(data):
+    """Client tells us its websocket-first attempt failed and it fell back to polling"""
+    client_id = request.sid
+    if isinstance(data, dict) and data.get('websocket_failed'):
+        print(f"Transport fallback reported by {client_id}", flush=True)
+        transport_policy.record_fallback(client_id, request.environ)
+
 def check_timeouts():
-    """Background thread to check for user timeouts"""
+    """Background thread to check for user timeouts and confirm transport upgrades"""
     while True:
         time.sleep(1)
         
+        # Confirm websocket upgrades that completed since the last pass
+        transport_policy.confirm_upgrades()
+        
         timed_out_user = queue_manager.check_timeout()
         if timed_out_user:
             # Stop all motors
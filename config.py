@@ -46,3 +46,28 @@ BRAKE_ACTIVE_LOW = True  # True: 0=applied, 1=released; False: 1=applied, 0=rele
 
 # For digital brake, threshold from UI (0-100) above which brake is considered ON
 BRAKE_APPLY_THRESHOLD = 1
+
+# Profiling / debug routes
+# Timing hooks on Socket.IO handlers and controller methods (also toggleable at runtime)
+PROFILING_ENABLED = False
+# Token required by /debug/* routes (X-Debug-Token header); None disables them
+DEBUG_TOKEN = None
+# Stack sampler settings
+PROFILE_SAMPLE_INTERVAL = 0.005  # seconds between samples
+PROFILE_MAX_SECONDS = 60         # upper bound for a single sampling run
+
+# Socket.IO transport policy
+# Transports the server accepts
+SOCKETIO_TRANSPORTS = ['polling', 'websocket']
+# 'websocket_first': clients try WebSocket and fall back to polling per client
+# 'polling_first': every client starts on polling and upgrades (old Cloudflare behaviour)
+TRANSPORT_POLICY = 'websocket_first'
+# Networks (CIDR) always served polling-first, e.g. ['203.0.113.0/24']
+TRANSPORT_KNOWN_BAD_NETWORKS = []
+# How long a network stays polling-first after a client there reports a WebSocket failure
+TRANSPORT_BAD_NETWORK_TTL = 86400  # seconds
+# Proxies (CIDR) whose CF-Connecting-IP / X-Forwarded-For headers are trusted;
+# loopback covers a local cloudflared tunnel. Other clients are keyed by REMOTE_ADDR.
+TRANSPORT_TRUSTED_PROXIES = ['127.0.0.1/32', '::1/128']
+# Closed connections kept for /debug/transports
+TRANSPORT_HISTORY_SIZE = 200
@@ -44,17 +44,25 @@ except Exception:  # ImportError or runtime errors on non-Pi
 import sys
 import time
 import config
+import profiler
 
 
+@profiler.instrument
 class MotorController:
-    def __init__(self):
-        # GPIO Pin assignments - can be moved to config.py if needed
+    def __init__(self, pi=None):
+        # GPIO Pin assignments (shared with simulator.SimulatedPi via config)
         self.motors = {
-            1: {'speed': 18, 'brake': 23, 'direction': 24},
-            2: {'speed': 13, 'brake': 25, 'direction': 8},
-            3: {'speed': 12, 'brake': 16, 'direction': 7}
+            motor_id: dict(pins) for motor_id, pins in config.MOTOR_PINS.items()
         }
         
+        if pi is not None:
+            # Injected backend (e.g. simulator.SimulatedPi) - skip pigpio discovery.
+            # The caller owns its lifetime, so no atexit cleanup is registered.
+            self.pi = pi
+            print(f"MotorController backend: {type(pi).__name__}, connected={getattr(pi, 'connected', 'n/a')}")
+            self._setup_pins()
+            return
+
         # On Linux (Pi hardware), require real pigpio module
         if sys.platform.startswith('linux') and not _PIGPIO_AVAILABLE:
             raise Exception("pigpio Python module not found. Install with: sudo apt-get install -y python3-pigpio pigpio")
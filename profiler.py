@@ -0,0 +1,136 @@
+import functools
+import sys
+import threading
+import time
+from collections import Counter
+
+import config
+
+
+# Timing hooks are cheap no-ops until enabled (at startup via config or at
+# runtime via the debug routes), so handlers can stay decorated permanently.
+_timing_enabled = bool(getattr(config, 'PROFILING_ENABLED', False))
+_timings = {}
+_timings_lock = threading.Lock()
+
+# Only one stack sampler may run at a time
+_sampler_lock = threading.Lock()
+
+
+def set_timing_enabled(enabled):
+    """Turn the timing hooks on or off at runtime"""
+    global _timing_enabled
+    _timing_enabled = bool(enabled)
+
+
+def is_timing_enabled():
+    return _timing_enabled
+
+
+def _record(name, elapsed):
+    with _timings_lock:
+        stats = _timings.get(name)
+        if stats is None:
+            _timings[name] = {'count': 1, 'total': elapsed, 'max': elapsed}
+        else:
+            stats['count'] += 1
+            stats['total'] += elapsed
+            if elapsed > stats['max']:
+                stats['max'] = elapsed
+
+
+def timed(name=None):
+    """
+    Decorator recording call count, total and max wall time under `name`.
+
+    When timing is disabled the only cost is a single global flag check.
+    """
+    def decorator(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _timing_enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(label, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument(cls):
+    """Class decorator applying `timed` to every public method of `cls`"""
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith('_') or not callable(value):
+            continue
+        setattr(cls, attr, timed(f"{cls.__name__}.{attr}")(value))
+    return cls
+
+
+def get_timings():
+    """Snapshot of recorded timings, milliseconds, slowest total first"""
+    with _timings_lock:
+        items = [(name, dict(stats)) for name, stats in _timings.items()]
+    result = []
+    for name, stats in items:
+        result.append({
+            'name': name,
+            'count': stats['count'],
+            'total_ms': round(stats['total'] * 1000, 3),
+            'avg_ms': round(stats['total'] * 1000 / stats['count'], 3),
+            'max_ms': round(stats['max'] * 1000, 3),
+        })
+    result.sort(key=lambda s: s['total_ms'], reverse=True)
+    return result
+
+
+def reset_timings():
+    with _timings_lock:
+        _timings.clear()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    filename = code.co_filename.replace('\\', '/').rsplit('/', 1)[-1]
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, interval=None):
+    """
+    Statistically sample every thread's stack for `seconds`.
+
+    Returns aggregated stacks in the folded format consumed by
+    flamegraph.pl / speedscope ("root;caller;callee count" per line),
+    or None if another sampling run is already in progress.
+    """
+    if interval is None:
+        interval = getattr(config, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+    if not _sampler_lock.acquire(blocking=False):
+        return None
+    try:
+        own_ident = threading.get_ident()
+        names = {}
+        counts = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                thread_name = names.get(ident, f"thread-{ident}")
+                stack.append(thread_name)
+                stack.reverse()
+                counts[';'.join(stack)] += 1
+            time.sleep(interval)
+        lines = [f"{stack} {count}" for stack, count in counts.most_common()]
+        return '\n'.join(lines) + ('\n' if lines else '')
+    finally:
+        _sampler_lock.release()
@@ -2,6 +2,10 @@ import time
 from collections import deque
 from threading import Lock
 
+import profiler
+
+
+@profiler.instrument
 class QueueManager:
     def __init__(self, timeout_seconds=120):
         self.queue = deque()
@@ -0,0 +1,307 @@
+"""
+Physics-based stand-in for the pigpio `pi` object.
+
+SimulatedPi accepts the same calls MotorController makes on a real pi,
+logs every GPIO operation and integrates each platter's speed at a fixed
+timestep in virtual time. Nothing moves until advance() is called, so a
+minute of platter behaviour runs in milliseconds.
+
+Usage:
+    sim = SimulatedPi()
+    mc = MotorController(pi=sim)
+    mc.set_motor(1, 100, 1, 0)
+    sim.advance(5.0)
+    print(sim.stats())
+"""
+
+import math
+
+import config
+
+
+OUTPUT = 1
+
+RAD_S_TO_RPM = 60.0 / (2 * math.pi)
+
+
+class MotorModel:
+    """Mechanical/driver parameters for one simulated platter"""
+
+    def __init__(self, inertia=0.02, torque_max=0.5, viscous=0.004,
+                 coulomb=0.01, deadband=0.08, brake_torque=1.0,
+                 brake_hold=0.2):
+        self.inertia = inertia            # kg*m^2 (platter + rotor)
+        self.torque_max = torque_max      # N*m at 100% duty
+        self.viscous = viscous            # N*m per rad/s
+        self.coulomb = coulomb            # N*m, constant bearing friction
+        self.deadband = deadband          # duty fraction producing no torque
+        self.brake_torque = brake_torque  # N*m at 100% duty with brake applied
+        self.brake_hold = brake_hold      # brake strength fraction at 0% duty
+
+
+class _MotorState:
+    def __init__(self, pins, model):
+        self.pins = pins
+        self.model = model
+        self.duty = 0
+        self.direction = 0
+        self.brake_level = None  # unknown until first write
+        self.omega = 0.0         # rad/s, signed by direction
+        self.samples = []        # (t, rpm)
+        self.brake_while_driving = []  # [start, end] virtual-time intervals
+
+
+class SimulatedPi:
+    OUTPUT = OUTPUT
+
+    def __init__(self, motor_pins=None, models=None, timestep=0.001,
+                 sample_interval=0.01):
+        self.connected = True
+        self.timestep = timestep
+        self.sample_interval = sample_interval
+        self.now = 0.0
+        self._next_sample = 0.0
+
+        self.pwm_range = {}
+        self.pwm_frequency = {}
+        self.levels = {}
+        self.calls = []  # (t, method, pin, value, redundant)
+
+        motor_pins = motor_pins or config.MOTOR_PINS
+        models = models or {}
+        self.motors = {
+            motor_id: _MotorState(pins, models.get(motor_id) or MotorModel())
+            for motor_id, pins in motor_pins.items()
+        }
+        self._pin_roles = {}
+        for motor_id, pins in motor_pins.items():
+            for role, pin in pins.items():
+                self._pin_roles[pin] = (motor_id, role)
+        self._record_samples()
+
+    # pigpio API
+
+    def set_mode(self, pin, mode):
+        self._log('set_mode', pin, mode)
+
+    def write(self, pin, level):
+        level = 1 if level else 0
+        self._log('write', pin, level)
+        self.levels[pin] = level
+        role = self._pin_roles.get(pin)
+        if role is None:
+            return
+        motor = self.motors[role[0]]
+        if role[1] == 'direction':
+            motor.direction = level
+        elif role[1] == 'brake':
+            motor.brake_level = level
+
+    def set_PWM_frequency(self, pin, frequency):
+        self._log('set_PWM_frequency', pin, frequency)
+        self.pwm_frequency[pin] = frequency
+        return frequency
+
+    def set_PWM_range(self, pin, pwm_range):
+        self._log('set_PWM_range', pin, pwm_range)
+        self.pwm_range[pin] = pwm_range
+
+    def set_PWM_dutycycle(self, pin, duty):
+        self._log('set_PWM_dutycycle', pin, duty)
+        self.levels[pin] = duty
+        role = self._pin_roles.get(pin)
+        if role is not None and role[1] == 'speed':
+            self.motors[role[0]].duty = duty
+
+    def stop(self):
+        self.connected = False
+
+    # Simulation
+
+    def _log(self, method, pin, value):
+        current = {
+            'write': self.levels,
+            'set_PWM_dutycycle': self.levels,
+            'set_PWM_frequency': self.pwm_frequency,
+            'set_PWM_range': self.pwm_range,
+        }.get(method, {})
+        redundant = pin in current and current[pin] == value
+        self.calls.append((self.now, method, pin, value, redundant))
+
+    def _brake_applied(self, motor):
+        if motor.brake_level is None:
+            return False
+        active = 0 if config.BRAKE_ACTIVE_LOW else 1
+        return motor.brake_level == active
+
+    def _duty_fraction(self, motor):
+        pwm_range = self.pwm_range.get(motor.pins['speed'], config.PWM_RANGE)
+        if pwm_range <= 0:
+            return 0.0
+        return max(0.0, min(1.0, motor.duty / pwm_range))
+
+    def _step(self, motor, t, dt):
+        model = motor.model
+        duty = self._duty_fraction(motor)
+        omega = motor.omega
+        torque = 0.0
+
+        if self._brake_applied(motor):
+            # Driver ignores the drive command and brakes with strength set by duty
+            if duty > model.deadband:
+                intervals = motor.brake_while_driving
+                if intervals and abs(intervals[-1][1] - t) < dt / 2:
+                    intervals[-1][1] = t + dt
+                else:
+                    intervals.append([t, t + dt])
+            strength = max(model.brake_hold, duty)
+            brake = model.brake_torque * strength
+        else:
+            brake = 0.0
+            if duty > model.deadband:
+                effective = (duty - model.deadband) / (1.0 - model.deadband)
+                sign = 1.0 if motor.direction else -1.0
+                torque = sign * effective * model.torque_max
+
+        torque -= model.viscous * omega
+        # Coulomb friction and brake oppose motion and cannot reverse it
+        resist = model.coulomb + brake
+        if omega != 0.0:
+            new_omega = omega + (torque - math.copysign(resist, omega)) / model.inertia * dt
+            if (new_omega > 0) != (omega > 0):
+                new_omega = 0.0
+        elif abs(torque) > resist:
+            new_omega = (torque - math.copysign(resist, torque)) / model.inertia * dt
+        else:
+            new_omega = 0.0
+        motor.omega = new_omega
+
+    def _record_samples(self):
+        for motor in self.motors.values():
+            motor.samples.append((self.now, motor.omega * RAD_S_TO_RPM))
+        self._next_sample = self.now + self.sample_interval
+
+    def advance(self, seconds):
+        """Integrate all motors forward by `seconds` of virtual time"""
+        steps = int(round(seconds / self.timestep))
+        for _ in range(steps):
+            for motor in self.motors.values():
+                self._step(motor, self.now, self.timestep)
+            self.now += self.timestep
+            if self.now + 1e-12 >= self._next_sample:
+                self._record_samples()
+
+    def rpm(self, motor_id):
+        """Current signed RPM of a motor"""
+        return self.motors[motor_id].omega * RAD_S_TO_RPM
+
+    def rpm_stream(self, motor_id, since=0.0):
+        """List of (virtual_time, rpm) samples at or after `since`"""
+        return [s for s in self.motors[motor_id].samples if s[0] >= since]
+
+    def time_to_rpm(self, motor_id, target_rpm, since=0.0):
+        """Seconds after `since` until |rpm| first reaches target_rpm, or None"""
+        for t, rpm in self.rpm_stream(motor_id, since):
+            if abs(rpm) >= target_rpm:
+                return t - since
+        return None
+
+    def spin_down_time(self, motor_id, since=0.0, threshold_rpm=1.0):
+        """Seconds after `since` until |rpm| first drops below threshold, or None"""
+        for t, rpm in self.rpm_stream(motor_id, since):
+            if abs(rpm) < threshold_rpm:
+                return t - since
+        return None
+
+    def gpio_stats(self, since=0.0):
+        """GPIO traffic counts; redundant calls re-wrote a pin's current value"""
+        by_method = {}
+        redundant = 0
+        total = 0
+        for t, method, _pin, _value, was_redundant in self.calls:
+            if t < since:
+                continue
+            total += 1
+            by_method[method] = by_method.get(method, 0) + 1
+            if was_redundant:
+                redundant += 1
+        return {'total': total, 'redundant': redundant, 'by_method': by_method}
+
+    def brake_while_driving_time(self, motor_id, since=0.0):
+        """Seconds after `since` the brake was applied while drive duty was above deadband"""
+        total = 0.0
+        for start, end in self.motors[motor_id].brake_while_driving:
+            if end > since:
+                total += end - max(start, since)
+        return total
+
+    def stats(self, since=0.0, settle_band=0.02):
+        """
+        Aggregate per-motor response statistics over samples since `since`.
+
+        Overshoot and settle band are relative to the step from the speed at
+        `since` to the final speed, in the direction of travel.
+        """
+        motors = {}
+        for motor_id in self.motors:
+            stream = self.rpm_stream(motor_id, since)
+            if not stream:
+                continue
+            initial = stream[0][1]
+            final = stream[-1][1]
+            step = final - initial
+            if step > 1.0:
+                overshoot = (max(rpm for _t, rpm in stream) - final) / step * 100.0
+            elif step < -1.0:
+                overshoot = (final - min(rpm for _t, rpm in stream)) / -step * 100.0
+            else:
+                overshoot = 0.0
+            peak = max(abs(rpm) for _t, rpm in stream)
+            band = max(settle_band * abs(step), 1.0)
+            settle = 0.0
+            for t, rpm in stream:
+                if abs(rpm - final) > band:
+                    settle = t - since
+            motors[motor_id] = {
+                'initial_rpm': round(abs(initial), 2),
+                'final_rpm': round(abs(final), 2),
+                'peak_rpm': round(peak, 2),
+                'overshoot_pct': round(max(0.0, overshoot), 2),
+                'settle_time_s': round(settle, 3),
+                'brake_while_driving_s': round(self.brake_while_driving_time(motor_id, since), 3),
+            }
+        return {
+            'virtual_time_s': round(self.now, 3),
+            'motors': motors,
+            'gpio': self.gpio_stats(since),
+        }
+
+
+if __name__ == '__main__':
+    # Spin-up / brake scenario for comparing MotorController changes
+    from motor_controller import MotorController
+
+    sim = SimulatedPi()
+    mc = MotorController(pi=sim)
+    setup_calls = len(sim.calls)
+    sim.advance(1.0)
+
+    start = sim.now
+    mc.set_motor(1, 100, 1, 0)
+    mc.set_motor(2, 50, 1, 0)
+    mc.set_motor(3, 10, 0, 0)
+    sim.advance(10.0)
+    spin_up = sim.stats(since=start)
+    rpm_1 = sim.rpm(1)
+
+    brake_start = sim.now
+    mc.set_motor(1, 100, 1, 100)
+    mc.stop_all()
+    sim.advance(10.0)
+
+    print(f"Setup GPIO calls: {setup_calls}")
+    print(f"Spin-up: {spin_up}")
+    print(f"Motor 1 time to 90%: {sim.time_to_rpm(1, 0.9 * rpm_1, since=start):.2f}s")
+    for motor_id in sim.motors:
+        print(f"Motor {motor_id} spin-down: {sim.spin_down_time(motor_id, since=brake_start):.2f}s")
+    print(f"Brake phase: {sim.stats(since=brake_start)}")
@@ -35,10 +35,14 @@ function debounce(fn, wait) {
 }
 
 // Initialize Socket.IO client FIRST (no auto-connect yet)
-// Cloudflare compatibility: use polling as primary transport since WebSocket may not work behind proxy
+// Transport order comes from the server's transport policy: websocket first, unless this
+// network is known to block WebSocket (e.g. behind some Cloudflare setups), then polling first
+const preferredTransports = window.SOCKETIO_TRANSPORTS || ['polling', 'websocket'];
+let websocketFailed = false;
+let websocketConnected = false; // Set once websocket has worked during this page load
 const socket = io({ 
     autoConnect: false,
-    transports: ['polling', 'websocket'],
+    transports: preferredTransports,
     reconnection: true,
     reconnectionDelay: 1000,
     reconnectionDelayMax: 5000,
@@ -49,14 +53,34 @@ const socket = io({
 socket.on('connect', () => {
     console.log('Connected to server');
     sessionId = socket.id;  // Capture the new session ID
+    if (socket.io.engine.transport.name === 'websocket') {
+        websocketConnected = true;
+    }
+    socket.io.engine.once('upgrade', (transport) => {
+        if (transport.name === 'websocket') {
+            websocketConnected = true;
+        }
+    });
     statusMessage.textContent = 'Connected';
     statusMessage.style.color = '#666';
+    if (websocketFailed) {
+        // Let the server remember this network so future visits start on polling
+        socket.emit('transport_report', { websocket_failed: true });
+        websocketFailed = false;
+    }
 });
 
 socket.on('connect_error', (err) => {
     console.error('Socket connect_error:', err);
     statusMessage.textContent = 'Connection failed';
     statusMessage.style.color = '#dc3545';
+    if (socket.io.opts.transports[0] === 'websocket' && !websocketConnected) {
+        // WebSocket has never connected on this page: retry with polling first (upgrade
+        // is still attempted). Errors after it has worked are server restarts, not the network
+        console.warn('WebSocket failed, falling back to polling');
+        websocketFailed = true;
+        socket.io.opts.transports = ['polling', 'websocket'];
+    }
 });
 
 socket.on('disconnect', () => {
@@ -0,0 +1,434 @@
+import io
+import json
+import ipaddress
+import threading
+import time
+import zlib
+from collections import deque
+from threading import Lock
+from urllib.parse import parse_qs
+
+
+WEBSOCKET_FIRST = ['websocket', 'polling']
+POLLING_FIRST = ['polling', 'websocket']
+
+# Counters for handshakes that never became a Socket.IO connection are dropped after this
+ORPHAN_SESSION_TTL = 60  # seconds
+# After an upgrade request, poll Engine.IO this often (for this long) to time the upgrade
+UPGRADE_WATCH_INTERVAL = 0.01
+UPGRADE_WATCH_SECONDS = 5
+
+
+class TransportPolicy:
+    """
+    Decides which Socket.IO transport order each client should try and
+    records per-connection transport telemetry.
+
+    Clients start websocket-first unless their network has been reported
+    as unable to open a WebSocket (e.g. a proxy that strips upgrades), in
+    which case they start on polling and attempt an upgrade afterwards.
+
+    `transport_lookup(eio_sid)` returns the Engine.IO session's current
+    transport; a connection only counts as upgraded (and its network as
+    websocket-capable) once it reports 'websocket'. upgrade_ms runs from the
+    Engine.IO handshake to that first observation, polled every
+    UPGRADE_WATCH_INTERVAL after an upgrade request is seen and otherwise by
+    the periodic confirm_upgrades() sweep.
+    """
+
+    def __init__(self, policy='websocket_first', known_bad_networks=None,
+                 bad_network_ttl=86400, history_size=200, trusted_proxies=None,
+                 transport_lookup=None):
+        self.policy = policy
+        self.bad_network_ttl = bad_network_ttl
+        self.static_bad_networks = [
+            ipaddress.ip_network(n, strict=False) for n in (known_bad_networks or [])
+        ]
+        self.trusted_proxies = [
+            ipaddress.ip_network(n, strict=False) for n in (trusted_proxies or [])
+        ]
+        self.transport_lookup = transport_lookup
+        self.bad_networks = {}  # network key -> expiry timestamp
+        self.connections = {}   # socketio sid -> record
+        self.engine_stats = {}  # engine.io sid -> HTTP-level counters
+        self.history = deque(maxlen=history_size)
+        self.lock = Lock()
+
+    def _from_trusted_proxy(self, remote_addr):
+        try:
+            addr = ipaddress.ip_address(remote_addr)
+        except ValueError:
+            return False
+        return any(addr in net for net in self.trusted_proxies)
+
+    def client_ip(self, environ):
+        """Visitor address; proxy headers are honoured only from trusted proxies"""
+        remote_addr = environ.get('REMOTE_ADDR', '')
+        if not self._from_trusted_proxy(remote_addr):
+            return remote_addr
+        ip = environ.get('HTTP_CF_CONNECTING_IP')
+        if not ip:
+            forwarded = environ.get('HTTP_X_FORWARDED_FOR', '')
+            ip = forwarded.split(',')[0].strip()
+        return ip or remote_addr
+
+    def network_key(self, environ):
+        """Group clients by /24 (IPv4) or /64 (IPv6) network"""
+        ip = self.client_ip(environ)
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return ip or 'unknown'
+        prefix = 24 if addr.version == 4 else 64
+        return str(ipaddress.ip_network(f"{addr}/{prefix}", strict=False))
+
+    def is_known_bad(self, environ):
+        ip = self.client_ip(environ)
+        try:
+            addr = ipaddress.ip_address(ip)
+            if any(addr in net for net in self.static_bad_networks):
+                return True
+        except ValueError:
+            pass
+        key = self.network_key(environ)
+        with self.lock:
+            expiry = self.bad_networks.get(key)
+            if expiry is None:
+                return False
+            if expiry < time.time():
+                del self.bad_networks[key]
+                return False
+            return True
+
+    def transports_for(self, environ):
+        """Transport order the client should try, first choice first"""
+        if self.policy == 'polling_first' or self.is_known_bad(environ):
+            return list(POLLING_FIRST)
+        return list(WEBSOCKET_FIRST)
+
+    def mark_bad(self, environ):
+        key = self.network_key(environ)
+        with self.lock:
+            if key not in self.bad_networks:
+                print(f"Transport: marking network {key} as websocket-incapable", flush=True)
+            self.bad_networks[key] = time.time() + self.bad_network_ttl
+
+    def _mark_good(self, key):
+        # Caller holds self.lock
+        if self.bad_networks.pop(key, None) is not None:
+            print(f"Transport: network {key} upgraded to websocket, clearing bad mark", flush=True)
+
+    def _new_session_stats(self):
+        return {
+            'handshake_at': time.time(),
+            'polling_requests': 0,
+            'polling_header_bytes': 0,
+            'polling_packets': 0,
+            'upgraded_at': None,
+        }
+
+    def register_session(self, eio_sid, stats):
+        """Called by the middleware once a polling handshake response names the session"""
+        with self.lock:
+            self.engine_stats.setdefault(eio_sid, stats)
+
+    def open_connection(self, sid, eio_sid, transport, environ):
+        """Called from the Socket.IO connect handler"""
+        with self.lock:
+            self.connections[sid] = {
+                'sid': sid,
+                'eio_sid': eio_sid,
+                'network': self.network_key(environ),
+                'initial_transport': transport,
+                'connected_at': time.time(),
+                'websocket_failed': False,
+            }
+            if eio_sid is not None and eio_sid not in self.engine_stats:
+                # Direct websocket handshake: the middleware never saw the sid
+                self.engine_stats[eio_sid] = self._new_session_stats()
+            elif eio_sid is not None and self.engine_stats[eio_sid]['upgraded_at'] is not None:
+                # Upgrade completed before this handler ran
+                self._mark_good(self.connections[sid]['network'])
+
+    def record_fallback(self, sid, environ):
+        """Client reported that its websocket-first attempt failed"""
+        with self.lock:
+            record = self.connections.get(sid)
+            if record is not None:
+                record['websocket_failed'] = True
+        self.mark_bad(environ)
+
+    def close_connection(self, sid):
+        self.confirm_upgrades()
+        with self.lock:
+            record = self.connections.pop(sid, None)
+            if record is None:
+                return
+            engine = self.engine_stats.pop(record['eio_sid'], None)
+            record['disconnected_at'] = time.time()
+            self.history.append(self._summarize(record, engine))
+
+    def _lookup_websocket(self, eio_sid):
+        try:
+            return self.transport_lookup(eio_sid) == 'websocket'
+        except Exception:
+            return False
+
+    def _set_upgraded(self, eio_sid, when):
+        with self.lock:
+            stats = self.engine_stats.get(eio_sid)
+            if stats is None or stats['upgraded_at'] is not None:
+                return
+            stats['upgraded_at'] = when
+            for record in self.connections.values():
+                if record['eio_sid'] == eio_sid:
+                    self._mark_good(record['network'])
+
+    def confirm_upgrades(self):
+        """
+        Ask Engine.IO which open polling-started connections are now on
+        websocket, record the upgrade and clear that network's bad mark.
+        Also drops counters for handshakes that never became a connection.
+        Called periodically and before telemetry is read.
+        """
+        now = time.time()
+        with self.lock:
+            attached = {r['eio_sid'] for r in self.connections.values()}
+            for eio_sid in [e for e, st in self.engine_stats.items()
+                            if e not in attached and now - st['handshake_at'] > ORPHAN_SESSION_TTL]:
+                del self.engine_stats[eio_sid]
+            pending = [
+                r['eio_sid'] for r in self.connections.values()
+                if r['initial_transport'] == 'polling'
+                and r['eio_sid'] in self.engine_stats
+                and self.engine_stats[r['eio_sid']]['upgraded_at'] is None
+            ]
+        if self.transport_lookup is None:
+            return
+        for eio_sid in pending:
+            if self._lookup_websocket(eio_sid):
+                self._set_upgraded(eio_sid, time.time())
+
+    def _watch_upgrade(self, eio_sid):
+        """Poll Engine.IO briefly after an upgrade attempt for a precise upgrade time"""
+        deadline = time.time() + UPGRADE_WATCH_SECONDS
+        while time.time() < deadline:
+            with self.lock:
+                stats = self.engine_stats.get(eio_sid)
+                if stats is None or stats['upgraded_at'] is not None:
+                    return
+            if self._lookup_websocket(eio_sid):
+                self._set_upgraded(eio_sid, time.time())
+                return
+            time.sleep(UPGRADE_WATCH_INTERVAL)
+
+    def observe_request(self, environ):
+        """
+        Account one /socket.io/ HTTP request (see TransportTelemetryMiddleware).
+
+        Returns the counters to charge the request's polling traffic to: the
+        session's, or fresh unregistered ones for a polling handshake (which
+        the middleware registers once the response names the sid). Returns
+        None for requests that cannot be attributed.
+        """
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        eio_sid = query.get('sid', [None])[0]
+        transport = query.get('transport', [None])[0]
+        if eio_sid is None:
+            if transport == 'polling' and environ.get('REQUEST_METHOD') == 'GET':
+                stats = self._new_session_stats()
+                stats['polling_requests'] = 1
+                stats['polling_header_bytes'] = _request_header_bytes(environ)
+                return stats
+            return None
+        with self.lock:
+            stats = self.engine_stats.get(eio_sid)
+            if stats is None:
+                # Unknown or stale session: nothing to attribute it to
+                return None
+            if transport == 'polling':
+                stats['polling_requests'] += 1
+                stats['polling_header_bytes'] += _request_header_bytes(environ)
+                return stats
+            watch = transport == 'websocket' and stats['upgraded_at'] is None
+        if watch and self.transport_lookup is not None:
+            threading.Thread(target=self._watch_upgrade, args=(eio_sid,), daemon=True).start()
+        return None
+
+    def add_polling_traffic(self, stats, header_bytes=0, packets=0):
+        with self.lock:
+            stats['polling_header_bytes'] += header_bytes
+            stats['polling_packets'] += packets
+
+    def _summarize(self, record, engine):
+        engine = engine or {}
+        upgraded_at = engine.get('upgraded_at')
+        if record['initial_transport'] == 'websocket':
+            transport = 'websocket'
+            upgrade_ms = 0.0
+        elif upgraded_at is not None:
+            transport = 'websocket'
+            started = engine.get('handshake_at') or record['connected_at']
+            upgrade_ms = round(max(0.0, upgraded_at - started) * 1000, 1)
+        else:
+            transport = 'polling'
+            upgrade_ms = None
+        polling_requests = engine.get('polling_requests', 0)
+        header_bytes = engine.get('polling_header_bytes', 0)
+        packets = engine.get('polling_packets', 0)
+        end = record.get('disconnected_at') or time.time()
+        return {
+            'sid': record['sid'],
+            'network': record['network'],
+            'initial_transport': record['initial_transport'],
+            'transport': transport,
+            'websocket_failed': record['websocket_failed'],
+            'upgrade_ms': upgrade_ms,
+            'duration_s': round(end - record['connected_at'], 1),
+            'polling_requests': polling_requests,
+            'polling_packets': packets,
+            'polling_header_bytes': header_bytes,
+            'header_bytes_per_packet': round(header_bytes / packets, 1) if packets else None,
+        }
+
+    def snapshot(self):
+        """Telemetry for open and recently closed connections plus aggregates"""
+        self.confirm_upgrades()
+        with self.lock:
+            open_records = [
+                self._summarize(r, self.engine_stats.get(r['eio_sid']))
+                for r in self.connections.values()
+            ]
+            closed_records = list(self.history)
+            now = time.time()
+            bad = {k: round(v - now) for k, v in self.bad_networks.items() if v > now}
+        records = open_records + closed_records
+        by_transport = {}
+        for r in records:
+            by_transport[r['transport']] = by_transport.get(r['transport'], 0) + 1
+        upgrades = [r['upgrade_ms'] for r in records
+                    if r['upgrade_ms'] is not None and r['initial_transport'] == 'polling']
+        return {
+            'policy': self.policy,
+            'by_transport': by_transport,
+            'fallbacks': sum(1 for r in records if r['websocket_failed']),
+            'avg_upgrade_ms': round(sum(upgrades) / len(upgrades), 1) if upgrades else None,
+            'polling_requests': sum(r['polling_requests'] for r in records),
+            'polling_packets': sum(r['polling_packets'] for r in records),
+            'polling_header_bytes': sum(r['polling_header_bytes'] for r in records),
+            'known_bad_networks': bad,
+            'open': open_records,
+            'closed': closed_records,
+        }
+
+
+def _request_header_bytes(environ):
+    """Approximate on-the-wire size of an HTTP request line and headers"""
+    size = len(environ.get('REQUEST_METHOD', '')) + len(environ.get('PATH_INFO', '')) \
+        + len(environ.get('QUERY_STRING', '')) + 12
+    for key, value in environ.items():
+        if key.startswith('HTTP_'):
+            size += len(key) - 5 + len(str(value)) + 4
+    return size
+
+
+def _count_packets(payload):
+    """Engine.IO v4 polling payloads separate packets with 0x1e"""
+    if not payload:
+        return 0
+    return payload.count(b'\x1e') + 1
+
+
+def _decode_body(body, encoding):
+    """Undo Engine.IO's gzip/deflate response compression; None if unknown"""
+    if not encoding:
+        return body
+    try:
+        if encoding == 'gzip':
+            return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        if encoding == 'deflate':
+            return zlib.decompress(body)
+    except zlib.error:
+        pass
+    return None
+
+
+def _handshake_sid(payload):
+    """Session id from an Engine.IO v4 open packet ('0{"sid": ...}')"""
+    if not payload or payload[:1] != b'0':
+        return None
+    try:
+        return json.loads(payload[1:].split(b'\x1e')[0]).get('sid')
+    except (ValueError, AttributeError):
+        return None
+
+
+class TransportTelemetryMiddleware:
+    """
+    WSGI wrapper that feeds Engine.IO HTTP requests to a TransportPolicy.
+
+    For polling requests, from the handshake onwards, it counts request and
+    response header bytes plus the packets carried in each direction (POST
+    bodies upstream, GET bodies downstream, decompressed when Engine.IO has
+    compressed them). POST bodies above `max_body_size` are passed through
+    uncounted so Engine.IO's own size limit rejects them before they are read.
+    """
+
+    def __init__(self, wsgi_app, policy, path='/socket.io', max_body_size=1000000):
+        self.wsgi_app = wsgi_app
+        self.policy = policy
+        self.path = path
+        self.max_body_size = max_body_size
+
+    def __call__(self, environ, start_response):
+        if not environ.get('PATH_INFO', '').startswith(self.path):
+            return self.wsgi_app(environ, start_response)
+        try:
+            stats = self.policy.observe_request(environ)
+        except Exception as e:
+            print(f"Transport telemetry error: {e}", flush=True)
+            stats = None
+        if stats is None:
+            return self.wsgi_app(environ, start_response)
+
+        method = environ.get('REQUEST_METHOD', 'GET')
+        if method == 'POST':
+            try:
+                length = int(environ.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                length = 0
+            if length > self.max_body_size:
+                return self.wsgi_app(environ, start_response)
+            body = environ['wsgi.input'].read(length) if length > 0 else b''
+            environ['wsgi.input'] = io.BytesIO(body)
+            self.policy.add_polling_traffic(stats, packets=_count_packets(body))
+
+        response_headers = {}
+
+        def counting_start_response(status, headers, exc_info=None):
+            size = len(status) + 11
+            for name, value in headers:
+                size += len(name) + len(value) + 4
+                response_headers[name.lower()] = value
+            self.policy.add_polling_traffic(stats, header_bytes=size)
+            if exc_info is not None:
+                return start_response(status, headers, exc_info)
+            return start_response(status, headers)
+
+        result = self.wsgi_app(environ, counting_start_response)
+        if method != 'GET':
+            return result
+        # Long-poll GET responses are small and already complete; buffer to count packets
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        payload = _decode_body(body, response_headers.get('content-encoding'))
+        if payload is not None:
+            self.policy.add_polling_traffic(stats, packets=_count_packets(payload))
+            if 'sid' not in parse_qs(environ.get('QUERY_STRING', '')):
+                eio_sid = _handshake_sid(payload)
+                if eio_sid:
+                    self.policy.register_session(eio_sid, stats)
+        return [body]